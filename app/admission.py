@@ -0,0 +1,103 @@
+import asyncio
+
+from fastapi.templating import Jinja2Templates
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.settings import settings
+
+templates = Jinja2Templates(directory="app/templates")
+
+
+class RouteClassLimiter:
+    # At most `limit` requests run at once; up to `queue_size` more may wait
+    # for a slot, each for at most `max_wait` seconds. Anything beyond that
+    # is rejected immediately.
+    def __init__(self, limit: int, queue_size: int, max_wait: float) -> None:
+        self._sem = asyncio.Semaphore(max(1, limit))
+        self._queue_size = max(0, queue_size)
+        self._max_wait = max_wait
+        self._waiting = 0
+
+    async def enter(self) -> bool:
+        if not self._sem.locked():
+            await self._sem.acquire()
+            return True
+        if self._waiting >= self._queue_size:
+            return False
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self._max_wait)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiting -= 1
+
+    def leave(self) -> None:
+        self._sem.release()
+
+
+def _route_class(method: str, path: str) -> str | None:
+    if path == "/health":
+        return None
+    if path.startswith("/static"):
+        return "static"
+    if path.startswith("/api/auth") or path in ("/login", "/register", "/logout"):
+        return "auth"
+    if path in ("/api/parts/search", "/api/parts/brands", "/api/cart/revalidate"):
+        # Revalidation fans out into supplier searches; keep it off the cart limit.
+        return "search"
+    if path == "/search" and method == "POST":
+        return "search"
+    if path.startswith("/cart") or path.startswith("/api/cart"):
+        return "cart"
+    return None
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        wait = settings.admission_queue_timeout_seconds
+        self._limiters = {
+            "auth": RouteClassLimiter(settings.admission_auth_limit, settings.admission_auth_queue, wait),
+            "search": RouteClassLimiter(settings.admission_search_limit, settings.admission_search_queue, wait),
+            "cart": RouteClassLimiter(settings.admission_cart_limit, settings.admission_cart_queue, wait),
+            "static": RouteClassLimiter(settings.admission_static_limit, settings.admission_static_queue, wait),
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class = _route_class(scope["method"], scope["path"])
+        limiter = self._limiters.get(route_class) if route_class else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.enter():
+            await _overloaded(scope)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.leave()
+
+
+def _overloaded(scope: Scope):
+    headers = {"Retry-After": str(settings.admission_retry_after_seconds)}
+    if scope["path"].startswith("/api"):
+        return JSONResponse({"detail": "Service is overloaded, retry later"}, status_code=503, headers=headers)
+    return templates.TemplateResponse(
+        "error.html",
+        {
+            "request": Request(scope),
+            "user": None,
+            "title": "Сервис перегружен",
+            "message": "Слишком много запросов. Попробуйте ещё раз через несколько секунд.",
+        },
+        status_code=503,
+        headers=headers,
+    )
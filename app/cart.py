@@ -1,7 +1,19 @@
-from sqlalchemy import delete, select
+import asyncio
+import logging
+
+from sqlalchemy import bindparam, delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.db import SessionLocal
 from app.models import CartItem
+from app.outbound import Priority
+from app.schemas import CartLineDiff, PartOffer
+from app.settings import settings
+from app.shared_cache import process_owner
+from app.supplier import SupplierClient
+from app.supplier_cache import cached_search_entry, supplier_cache
+
+log = logging.getLogger(__name__)
 
 
 async def list_cart(db: AsyncSession, user_id: int) -> list[CartItem]:
@@ -46,3 +58,144 @@ async def clear_cart(db: AsyncSession, *, user_id: int) -> None:
     await db.execute(delete(CartItem).where(CartItem.user_id == user_id))
     await db.commit()
 
+
+async def _fetch_offers(numbers: set[str], priority: Priority) -> dict[str, list[PartOffer] | None]:
+    # One upstream search per distinct article, at most N in flight.
+    # The result maps number -> offers for exactly that number, or None on error.
+    sem = asyncio.Semaphore(max(1, settings.cart_revalidate_concurrency))
+    client = SupplierClient()
+
+    async def one(number: str) -> tuple[str, list[PartOffer] | None]:
+        async with sem:
+            try:
+                entry = await cached_search_entry(number, refresh=True, priority=priority, client=client)
+                if entry is None:
+                    # Another worker is refreshing this article; wait for its result.
+                    entry = await cached_search_entry(number, priority=priority, client=client)
+                offers = entry[1]
+            except Exception as e:
+                log.warning("cart revalidation of %s failed: %s", number, e)
+                return number, None
+        return number, [o for o in offers if o.number == number]
+
+    try:
+        return dict(await asyncio.gather(*(one(n) for n in numbers)))
+    finally:
+        await client.aclose()
+
+
+def _match_offers(offers: list[PartOffer], supplier: str, name: str, delivery_days: int | None) -> list[PartOffer]:
+    # A warehouse may list several products under one article (other brands,
+    # other delivery terms). Only the same supplier and product name count;
+    # delivery_days breaks ties between what is left.
+    matches = [o for o in offers if o.supplier == supplier and o.name == name]
+    if len(matches) > 1:
+        same_delivery = [o for o in matches if o.delivery_days == delivery_days]
+        if same_delivery:
+            matches = same_delivery
+    return matches
+
+
+async def revalidate_carts(
+    db: AsyncSession,
+    *,
+    user_id: int | None = None,
+    priority: Priority = Priority.BULK,
+) -> list[CartLineDiff]:
+    stmt = select(
+        CartItem.id,
+        CartItem.supplier,
+        CartItem.number,
+        CartItem.name,
+        CartItem.price,
+        CartItem.currency,
+        CartItem.delivery_days,
+    ).order_by(CartItem.id)
+    if user_id is not None:
+        stmt = stmt.where(CartItem.user_id == user_id)
+    items = (await db.execute(stmt)).all()
+    # Don't hold a transaction open across the upstream searches below.
+    await db.commit()
+    if not items:
+        return []
+
+    offers = await _fetch_offers({it.number for it in items}, priority)
+
+    diffs: list[CartLineDiff] = []
+    updates: list[dict] = []
+    for it in items:
+        diff = CartLineDiff(
+            item_id=it.id,
+            supplier=it.supplier,
+            number=it.number,
+            status="unchanged",
+            old_price=float(it.price),
+            old_currency=it.currency,
+            old_delivery_days=it.delivery_days,
+        )
+        listed = offers.get(it.number)
+        matches = _match_offers(listed, it.supplier, it.name, it.delivery_days) if listed is not None else []
+        if listed is None:
+            diff.status = "error"
+        elif not matches:
+            diff.status = "unavailable"
+        elif len(matches) > 1:
+            # Can't tell which offer the line was added from; leave it alone.
+            diff.status = "ambiguous"
+        else:
+            offer = matches[0]
+            new_price = round(offer.price, 2)
+            diff.new_price = new_price
+            diff.new_currency = offer.currency
+            diff.new_delivery_days = offer.delivery_days
+            if (
+                new_price != round(float(it.price), 2)
+                or offer.currency != it.currency
+                or offer.delivery_days != it.delivery_days
+            ):
+                diff.status = "changed"
+                updates.append(
+                    {
+                        "b_id": it.id,
+                        "b_price": new_price,
+                        "b_currency": offer.currency,
+                        "b_delivery_days": offer.delivery_days,
+                    }
+                )
+        diffs.append(diff)
+
+    if updates:
+        # One Core executemany for all changed lines. Unlike the ORM bulk
+        # UPDATE it does not check rowcounts, so lines deleted while the
+        # searches ran are simply skipped.
+        cart_items = CartItem.__table__
+        stmt = (
+            update(cart_items)
+            .where(cart_items.c.id == bindparam("b_id"))
+            .values(
+                price=bindparam("b_price"),
+                currency=bindparam("b_currency"),
+                delivery_days=bindparam("b_delivery_days"),
+            )
+        )
+        await db.execute(stmt, updates)
+        await db.commit()
+    return diffs
+
+
+async def run_cart_revalidation() -> None:
+    interval = settings.cart_revalidate_interval_seconds
+    while True:
+        await asyncio.sleep(interval)
+        # Every worker runs this loop; the host-wide lease lets one of them do the work.
+        if not await supplier_cache.acquire("job:cart-revalidate", interval * 0.9, owner=process_owner()):
+            continue
+        try:
+            async with SessionLocal() as db:
+                diffs = await revalidate_carts(db)
+            changed = sum(1 for d in diffs if d.status == "changed")
+            log.info("cart revalidation: %d lines checked, %d changed", len(diffs), changed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("cart revalidation failed: %s", e)
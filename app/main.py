@@ -1,4 +1,5 @@
 import asyncio
+import logging
 
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
@@ -6,18 +7,31 @@ from fastapi.templating import Jinja2Templates
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.responses import JSONResponse, RedirectResponse
 
-from app.db import Base, engine
-from app.routers import auth, parts, web
+from app.admission import AdmissionMiddleware
+from app.cart import run_cart_revalidation
+from app.db import Base, SessionLocal, engine
+from app.popularity import run_stats_flush, search_stats
+from app.prefetch import run_prefetch
+from app.routers import auth, cart, parts, web
+from app.settings import settings
+from app.suggest import seed_article_index
 
 
+log = logging.getLogger(__name__)
+
 app = FastAPI(title="AutoShop", version="0.1.0")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
 app.include_router(auth.router)
 app.include_router(parts.router)
+app.include_router(cart.router)
 app.include_router(web.router)
 
+if settings.admission_enabled:
+    app.add_middleware(AdmissionMiddleware)
+
+
 def _is_api(request: Request) -> bool:
     return request.url.path.startswith("/api")
 
@@ -94,12 +108,31 @@ async def _init_db_with_retry() -> None:
     raise last_err or RuntimeError("DB init failed")
 
 
+_background_tasks: list[asyncio.Task] = []
+
+
 @app.on_event("startup")
 async def on_startup() -> None:
     await _init_db_with_retry()
+    async with SessionLocal() as db:
+        await seed_article_index(db)
+    _background_tasks.append(asyncio.create_task(run_stats_flush()))
+    if settings.prefetch_enabled:
+        _background_tasks.append(asyncio.create_task(run_prefetch()))
+    if settings.cart_revalidate_interval_seconds > 0:
+        _background_tasks.append(asyncio.create_task(run_cart_revalidation()))
 
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    try:
+        async with SessionLocal() as db:
+            await search_stats.flush(db)
+    except Exception as e:
+        log.warning("final search stats flush failed: %s", e)
     await engine.dispose()
 
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, Numeric, String, func
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, Numeric, String, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db import Base
@@ -31,3 +31,15 @@ class CartItem(Base):
     quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
+
+
+class SearchStat(Base):
+    # One row per search variant, so prefetch refreshes exactly what clients ask for.
+    __tablename__ = "search_stats"
+
+    article: Mapped[str] = mapped_column(String(64), primary_key=True)
+    brand: Mapped[str] = mapped_column(String(64), primary_key=True, default="")
+    with_cross: Mapped[bool] = mapped_column(Boolean, primary_key=True, default=False)
+    show_unavailable: Mapped[bool] = mapped_column(Boolean, primary_key=True, default=False)
+    hits: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, index=True)
+    last_seen: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
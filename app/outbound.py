@@ -0,0 +1,308 @@
+import asyncio
+import heapq
+import itertools
+import math
+import sqlite3
+import time
+import uuid
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+from app.settings import settings
+from app.shared_cache import SqliteCache, host_store
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BULK = 1
+    BACKGROUND = 2
+
+
+class SupplierQueueTimeout(RuntimeError):
+    pass
+
+
+# Upper bound on one supplier call; a slot left behind by a worker that died
+# mid-call is reclaimed after this.
+_SLOT_LEASE_SECONDS = 60.0
+# Slots freed by other workers don't wake this one, so retry this often.
+_SLOT_POLL_SECONDS = 0.05
+
+
+class _ClassStats:
+    def __init__(self) -> None:
+        self.granted = 0
+        self.dropped = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def as_dict(self, queued: int) -> dict:
+        return {
+            "queued": queued,
+            "granted": self.granted,
+            "dropped": self.dropped,
+            "wait_avg_ms": round(self.wait_total / self.granted * 1000, 1) if self.granted else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 1),
+        }
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: float) -> None:
+        self.rate = rate_per_second
+        self.burst = float(max(1.0, burst))
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+
+    async def take(self) -> float:
+        # 0 when a token was taken, otherwise seconds until one is due.
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+
+class SharedTokenBucket:
+    # The supplier quota is per account, not per process: every worker on the
+    # host draws from one bucket row in the shared store. If the store is
+    # unavailable, fall back to this worker's share of the rate.
+    def __init__(self, store: SqliteCache, name: str, rate_per_second: float, burst: float, workers: int) -> None:
+        self._store = store
+        self._name = name
+        self.rate = rate_per_second
+        self.burst = float(max(1.0, burst))
+        self._fallback = TokenBucket(rate_per_second / workers, max(1.0, burst / workers))
+
+    async def take(self) -> float:
+        try:
+            return await self._store.take_token(self._name, self.rate, self.burst)
+        except sqlite3.Error:
+            return await self._fallback.take()
+
+
+class SharedSlots:
+    # SUPPLIER_MAX_CONCURRENCY is a host-wide cap too: every call in flight
+    # holds a row in the shared store for its duration. If the store is
+    # unavailable, fall back to this worker's share of the cap.
+    def __init__(self, store: SqliteCache, name: str, limit: int, workers: int) -> None:
+        self._store = store
+        self._name = name
+        self.limit = max(1, limit)
+        self._fallback_limit = math.ceil(self.limit / workers)
+
+    async def take(self, in_flight: int) -> str | None:
+        # A ticket to release the slot with ("" for a locally counted one),
+        # or None when the host is at the cap. in_flight includes the caller.
+        ticket = uuid.uuid4().hex
+        try:
+            if await self._store.take_slot(self._name, ticket, self.limit, _SLOT_LEASE_SECONDS):
+                return ticket
+            return None
+        except sqlite3.Error:
+            return "" if in_flight <= self._fallback_limit else None
+
+    async def release(self, ticket: str) -> None:
+        if ticket:
+            await self._store.release_slot(self._name, ticket)
+
+
+class OutboundScheduler:
+    # Gatekeeper for calls to the supplier API: a token bucket caps the
+    # request rate, a local counter plus the host-wide slots cap calls in
+    # flight, and waiters are served strictly by priority class (FIFO within
+    # a class). A waiter still queued past its class deadline is dropped
+    # with SupplierQueueTimeout.
+    def __init__(
+        self,
+        *,
+        bucket: TokenBucket | SharedTokenBucket,
+        max_concurrency: int,
+        deadlines: dict[Priority, float],
+        slots: SharedSlots | None = None,
+    ) -> None:
+        self._bucket = bucket
+        self._slots = slots
+        self._max_concurrency = max(1, max_concurrency)
+        self._deadlines = deadlines
+        self._in_flight = 0
+        # (priority, seq, enqueued_at, deadline, future)
+        self._queue: list[tuple[int, int, float, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._pump: asyncio.Task | None = None
+        self._stats = {p: _ClassStats() for p in Priority}
+
+    def _record(self, priority: Priority, waited: float) -> None:
+        stats = self._stats[priority]
+        stats.granted += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+
+    async def _take(self) -> tuple[str | None, float]:
+        # Called with a local slot reserved. Returns the shared slot ticket
+        # when the call may go ahead, otherwise None and how long to wait.
+        ticket = ""
+        if self._slots is not None:
+            ticket = await self._slots.take(self._in_flight)
+            if ticket is None:
+                return None, _SLOT_POLL_SECONDS
+        try:
+            token_wait = await self._bucket.take()
+        except BaseException:
+            await self._release_shared(ticket)
+            raise
+        if token_wait > 0:
+            await self._release_shared(ticket)
+            return None, token_wait
+        return ticket, 0.0
+
+    async def _release_shared(self, ticket: str) -> None:
+        if self._slots is not None:
+            await self._slots.release(ticket)
+
+    async def acquire(self, priority: Priority) -> str:
+        # Returns the ticket to pass to release().
+        if not self._queue and self._in_flight < self._max_concurrency:
+            # Reserve the slot before awaiting the store and the bucket so
+            # concurrent callers cannot overshoot the cap.
+            self._in_flight += 1
+            try:
+                ticket, _ = await self._take()
+            except BaseException:
+                self._in_flight -= 1
+                raise
+            if ticket is not None:
+                self._record(priority, 0.0)
+                return ticket
+            self._in_flight -= 1
+
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        fut: asyncio.Future = loop.create_future()
+        deadline = now + self.deadline(priority)
+        heapq.heappush(self._queue, (int(priority), next(self._seq), now, deadline, fut))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run_pump())
+        self._wakeup.set()
+        try:
+            return await fut
+        except asyncio.CancelledError:
+            # Granted right before the caller went away: hand the slot back.
+            if fut.done() and not fut.cancelled():
+                await self.release(fut.result())
+            raise
+
+    def deadline(self, priority: Priority) -> float:
+        return self._deadlines.get(priority, 30.0)
+
+    async def release(self, ticket: str = "") -> None:
+        self._in_flight = max(0, self._in_flight - 1)
+        self._wakeup.set()
+        await self._release_shared(ticket)
+
+    def _drop_expired(self, now: float) -> None:
+        if not any(entry[3] <= now or entry[4].done() for entry in self._queue):
+            return
+        kept = []
+        for entry in self._queue:
+            priority, _, _, deadline, fut = entry
+            if fut.done():
+                continue
+            if deadline <= now:
+                self._stats[Priority(priority)].dropped += 1
+                fut.set_exception(SupplierQueueTimeout("Supplier request queue timeout"))
+                continue
+            kept.append(entry)
+        heapq.heapify(kept)
+        self._queue = kept
+
+    async def _run_pump(self) -> None:
+        while self._queue:
+            self._wakeup.clear()
+            self._drop_expired(time.monotonic())
+            retry = 0.0
+            while self._queue and self._in_flight < self._max_concurrency:
+                self._in_flight += 1
+                ticket, retry = await self._take()
+                if ticket is None:
+                    self._in_flight -= 1
+                    break
+                # The best waiter is picked after the await: one of higher
+                # priority may have queued in the meantime.
+                while self._queue and self._queue[0][4].done():
+                    heapq.heappop(self._queue)
+                if not self._queue:
+                    self._in_flight -= 1
+                    await self._release_shared(ticket)
+                    break
+                priority, _, enqueued_at, _, fut = heapq.heappop(self._queue)
+                self._record(Priority(priority), time.monotonic() - enqueued_at)
+                fut.set_result(ticket)
+            if not self._queue:
+                break
+
+            # Sleep until a token or shared slot may be free, a call finishes
+            # or the nearest deadline.
+            timeout = min(entry[3] for entry in self._queue) - time.monotonic()
+            if retry > 0:
+                timeout = min(timeout, retry)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.001, timeout))
+            except asyncio.TimeoutError:
+                pass
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE):
+        ticket = await self.acquire(priority)
+        try:
+            yield
+        finally:
+            await self.release(ticket)
+
+    def stats(self) -> dict:
+        queued = {p: 0 for p in Priority}
+        for entry in self._queue:
+            if not entry[4].done():
+                queued[Priority(entry[0])] += 1
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self._max_concurrency,
+            "shared_concurrency_limit": self._slots is not None,
+            "shared_rate_limit": isinstance(self._bucket, SharedTokenBucket),
+            "rate_per_second": self._bucket.rate,
+            "queue_depth": sum(queued.values()),
+            "classes": {p.name.lower(): self._stats[p].as_dict(queued[p]) for p in Priority},
+        }
+
+
+def _make_scheduler() -> OutboundScheduler:
+    # SUPPLIER_RATE_* and SUPPLIER_MAX_CONCURRENCY are host-wide totals,
+    # enforced through the shared store. Only when the store is disabled or
+    # failing are they split evenly across WEB_CONCURRENCY workers.
+    workers = max(1, settings.web_concurrency)
+    bucket: TokenBucket | SharedTokenBucket
+    slots: SharedSlots | None = None
+    if host_store is not None:
+        bucket = SharedTokenBucket(
+            host_store, "supplier", settings.supplier_rate_per_second, settings.supplier_rate_burst, workers
+        )
+        slots = SharedSlots(host_store, "supplier", settings.supplier_max_concurrency, workers)
+        max_concurrency = settings.supplier_max_concurrency
+    else:
+        bucket = TokenBucket(settings.supplier_rate_per_second / workers, settings.supplier_rate_burst / workers)
+        max_concurrency = math.ceil(settings.supplier_max_concurrency / workers)
+    return OutboundScheduler(
+        bucket=bucket,
+        max_concurrency=max_concurrency,
+        slots=slots,
+        deadlines={
+            Priority.INTERACTIVE: settings.supplier_queue_deadline_interactive,
+            Priority.BULK: settings.supplier_queue_deadline_bulk,
+            Priority.BACKGROUND: settings.supplier_queue_deadline_background,
+        },
+    )
+
+
+supplier_scheduler = _make_scheduler()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import SessionLocal
+from app.models import SearchStat
+from app.settings import settings
+from app.suggest import normalize_article
+
+log = logging.getLogger(__name__)
+
+
+# (article, brand, with_cross, show_unavailable)
+SearchVariant = tuple[str, str, bool, bool]
+
+# Bounds memory if flushes keep failing (e.g. the database is down).
+_MAX_PENDING = 50_000
+# Rows per upsert: 5 bind params each, well under the 32767 Postgres limit.
+_FLUSH_CHUNK = 6000
+_PRUNE_SECONDS = 3600.0
+
+
+class SearchStats:
+    # Hits are counted in memory and flushed to search_stats in one upsert,
+    # so the search path never waits on the database.
+    def __init__(self) -> None:
+        self._pending: Counter[SearchVariant] = Counter()
+
+    def record(
+        self,
+        article: str,
+        *,
+        brand: str | None = None,
+        with_cross: bool = False,
+        show_unavailable: bool = False,
+    ) -> None:
+        key = normalize_article(article)
+        brand_key = (brand or "").strip().upper()
+        if not key or len(key) > 64 or len(brand_key) > 64:
+            return
+        variant = (key, brand_key, bool(with_cross), bool(show_unavailable))
+        if variant in self._pending or len(self._pending) < _MAX_PENDING:
+            self._pending[variant] += 1
+
+    async def flush(self, db: AsyncSession) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, Counter()
+        items = list(pending.items())
+        for start in range(0, len(items), _FLUSH_CHUNK):
+            chunk = items[start : start + _FLUSH_CHUNK]
+            try:
+                await db.execute(_upsert(chunk))
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                # Earlier chunks are committed; keep only what didn't make it.
+                self._pending.update(dict(items[start:]))
+                raise
+
+
+def _upsert(chunk: list[tuple[SearchVariant, int]]):
+    stmt = insert(SearchStat).values(
+        [
+            {
+                "article": article,
+                "brand": brand,
+                "with_cross": with_cross,
+                "show_unavailable": show_unavailable,
+                "hits": hits,
+            }
+            for (article, brand, with_cross, show_unavailable), hits in chunk
+        ]
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[
+            SearchStat.article,
+            SearchStat.brand,
+            SearchStat.with_cross,
+            SearchStat.show_unavailable,
+        ],
+        set_={"hits": SearchStat.hits + stmt.excluded.hits, "last_seen": func.now()},
+    )
+
+
+search_stats = SearchStats()
+
+
+def _window_start():
+    return func.now() - timedelta(days=settings.search_stats_window_days)
+
+
+async def top_searches(db: AsyncSession, limit: int) -> list[SearchVariant]:
+    # Only variants searched within the window count, so formerly hot
+    # articles drop out instead of holding their all-time rank forever.
+    res = await db.execute(
+        select(SearchStat.article, SearchStat.brand, SearchStat.with_cross, SearchStat.show_unavailable)
+        .where(SearchStat.last_seen >= _window_start())
+        .order_by(SearchStat.hits.desc())
+        .limit(limit)
+    )
+    return [tuple(row) for row in res.all()]
+
+
+async def prune_search_stats(db: AsyncSession) -> None:
+    # Variants not searched within the window start again from zero.
+    await db.execute(delete(SearchStat).where(SearchStat.last_seen < _window_start()))
+    await db.commit()
+
+
+async def run_stats_flush() -> None:
+    pruned_at = 0.0
+    while True:
+        await asyncio.sleep(settings.search_stats_flush_seconds)
+        try:
+            async with SessionLocal() as db:
+                await search_stats.flush(db)
+                if time.monotonic() - pruned_at >= _PRUNE_SECONDS:
+                    await prune_search_stats(db)
+                    pruned_at = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("search stats flush failed: %s", e)
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+from app.db import SessionLocal
+from app.outbound import Priority
+from app.popularity import SearchVariant, top_searches
+from app.settings import settings
+from app.shared_cache import process_owner
+from app.supplier import SupplierClient
+from app.supplier_cache import cached_search_entry, search_key, supplier_cache
+
+log = logging.getLogger(__name__)
+
+_TICK_SECONDS = 5.0
+_RELOAD_TOP_SECONDS = 60.0
+# Renewed every tick by the holder; outlives a few missed ticks before another worker takes over.
+_LEASE_SECONDS = _TICK_SECONDS * 3
+
+
+class RefreshBudget:
+    # Token bucket: refills budget_per_minute tokens per minute, starts full
+    # so a fresh process can warm its hottest articles right away.
+    def __init__(self, budget_per_minute: int) -> None:
+        self._capacity = float(max(0, budget_per_minute))
+        self._rate = self._capacity / 60.0
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+
+def _key(variant: SearchVariant) -> str:
+    article, brand, with_cross, show_unavailable = variant
+    return search_key(article, brand=brand or None, with_cross=with_cross, show_unavailable=show_unavailable)
+
+
+async def _due(variants: list[SearchVariant]) -> list[SearchVariant]:
+    ahead = settings.prefetch_refresh_ahead_seconds
+    return [v for v in variants if await supplier_cache.ttl_left(_key(v)) <= ahead]
+
+
+async def _refresh(client: SupplierClient, budget: RefreshBudget, variants: list[SearchVariant]) -> None:
+    if not settings.supplier_api_base_url:
+        return
+    # Hottest first: when the budget runs out the tail waits for the next tick.
+    for article, brand, with_cross, show_unavailable in await _due(variants):
+        if not budget.take():
+            return
+        try:
+            await cached_search_entry(
+                article,
+                brand=brand or None,
+                with_cross=with_cross,
+                show_unavailable=show_unavailable,
+                refresh=True,
+                priority=Priority.BACKGROUND,
+                client=client,
+            )
+        except Exception as e:
+            log.warning("prefetch of %s failed: %s", article, e)
+
+
+async def _load_top() -> list[SearchVariant]:
+    async with SessionLocal() as db:
+        return await top_searches(db, settings.prefetch_top_n)
+
+
+async def run_prefetch() -> None:
+    budget = RefreshBudget(settings.prefetch_budget_per_minute)
+    client = SupplierClient()
+    hot: list[SearchVariant] = []
+    loaded_at = 0.0
+    try:
+        while True:
+            try:
+                # Only the lease holder refreshes, so the budget is per host, not per worker.
+                if not await supplier_cache.acquire("job:prefetch", _LEASE_SECONDS, owner=process_owner()):
+                    await asyncio.sleep(_TICK_SECONDS)
+                    continue
+                if time.monotonic() - loaded_at >= _RELOAD_TOP_SECONDS:
+                    hot = await _load_top()
+                    loaded_at = time.monotonic()
+                await _refresh(client, budget, hot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("prefetch tick failed: %s", e)
+            await asyncio.sleep(_TICK_SECONDS)
+    finally:
+        await client.aclose()
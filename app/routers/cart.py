@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cart import revalidate_carts
+from app.db import get_db
+from app.deps import get_current_user
+from app.outbound import Priority
+from app.schemas import CartRevalidateResponse
+
+router = APIRouter(prefix="/api/cart", tags=["cart"])
+
+
+@router.post("/revalidate", response_model=CartRevalidateResponse)
+async def revalidate(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    items = await revalidate_carts(db, user_id=user.id, priority=Priority.INTERACTIVE)
+    changed = sum(1 for it in items if it.status == "changed")
+    return CartRevalidateResponse(checked=len(items), changed=changed, items=items)
@@ -1,23 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse
 
 from app.deps import get_current_user
+from app.outbound import supplier_scheduler
+from app.popularity import search_stats
 from app.schemas import SearchResponse
-from app.supplier import SupplierClient
+from app.settings import settings
+from app.suggest import article_index
+from app.supplier_cache import cached_brands_entry, cached_search_entry, etag_for
 
 router = APIRouter(prefix="/api/parts", tags=["parts"])
 
 
+def _cache_headers(etag: str) -> dict[str, str]:
+    cache_control = f"private, max-age={settings.http_cache_max_age_seconds}"
+    if settings.http_cache_stale_while_revalidate_seconds > 0:
+        cache_control += f", stale-while-revalidate={settings.http_cache_stale_while_revalidate_seconds}"
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
 @router.get("/search", response_model=SearchResponse)
 async def search_parts(
+    request: Request,
     number: str,
     brand: str | None = None,
     with_cross: int = 0,
     show_unavailable: int = 0,
     _user=Depends(get_current_user),
 ):
-    client = SupplierClient()
+    search_stats.record(
+        number,
+        brand=brand,
+        with_cross=bool(with_cross),
+        show_unavailable=bool(show_unavailable),
+    )
     try:
-        offers = await client.search(
+        raw, offers = await cached_search_entry(
             number,
             brand=brand,
             with_cross=bool(with_cross),
@@ -25,19 +54,36 @@ async def search_parts(
         )
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Supplier error: {e}") from e
-    finally:
-        await client.aclose()
-    return SearchResponse(number=number.strip().upper(), offers=offers)
+    # The ETag is a hash of the cached bytes, so a 304 needs no JSON encode.
+    headers = _cache_headers(etag_for(raw))
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    article_index.add_many(o.number for o in offers)
+    body = SearchResponse(number=number.strip().upper(), offers=offers)
+    return JSONResponse(body.model_dump(), headers=headers)
 
 
-@router.get("/brands")
-async def brands(article: str, _user=Depends(get_current_user)):
-    client = SupplierClient()
+@router.get("/brands", response_model=list[str])
+async def brands(request: Request, article: str, _user=Depends(get_current_user)):
     try:
-        res = await client.brands(article)
+        raw, res = await cached_brands_entry(article)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Supplier error: {e}") from e
-    finally:
-        await client.aclose()
-    return res
+    headers = _cache_headers(etag_for(raw))
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(res, headers=headers)
+
+
+@router.get("/suggest")
+async def suggest(
+    prefix: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(10, ge=1, le=50),
+    _user=Depends(get_current_user),
+):
+    return article_index.suggest(prefix, limit)
+
 
+@router.get("/outbound-stats")
+async def outbound_stats(_user=Depends(get_current_user)):
+    return supplier_scheduler.stats()
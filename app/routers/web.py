@@ -7,8 +7,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.cart import add_to_cart, clear_cart, list_cart, remove_from_cart
 from app.db import get_db
 from app.deps import get_current_user
+from app.popularity import search_stats
 from app.security import create_access_token
-from app.supplier import SupplierClient
+from app.suggest import article_index
+from app.supplier_cache import cached_search
 from app.users import authenticate_user, create_user, get_user_by_username
 
 templates = Jinja2Templates(directory="app/templates")
@@ -121,15 +123,14 @@ async def search_action(
     number: str = Form(...),
     user=Depends(get_current_user),
 ):
-    client = SupplierClient()
+    search_stats.record(number)
     try:
-        offers = await client.search(number)
+        offers = await cached_search(number)
         error = None
+        article_index.add_many(o.number for o in offers)
     except (httpx.HTTPError, RuntimeError) as e:
         offers = []
         error = str(e)
-    finally:
-        await client.aclose()
     return templates.TemplateResponse(
         "search.html",
         {
@@ -188,6 +189,7 @@ async def cart_add(
         delivery_days=dd,
         quantity=quantity,
     )
+    article_index.add(number)
     return _redirect("/cart")
 
 
@@ -30,3 +30,22 @@ class SearchResponse(BaseModel):
     number: str
     offers: list[PartOffer]
 
+
+
+class CartLineDiff(BaseModel):
+    item_id: int
+    supplier: str
+    number: str
+    status: str  # unchanged | changed | unavailable | ambiguous | error
+    old_price: float
+    new_price: float | None = None
+    old_currency: str
+    new_currency: str | None = None
+    old_delivery_days: int | None = None
+    new_delivery_days: int | None = None
+
+
+class CartRevalidateResponse(BaseModel):
+    checked: int
+    changed: int
+    items: list[CartLineDiff]
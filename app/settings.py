@@ -23,5 +23,64 @@ class Settings(BaseSettings):
     supplier_password: str = ""
     supplier_agreement_id: int | None = None
 
+    # Outbound supplier call scheduling. Rate and concurrency are host-wide
+    # totals enforced through the host cache store. web_concurrency must match
+    # uvicorn's worker count (uvicorn reads the same WEB_CONCURRENCY variable):
+    # the limits are divided by it whenever the shared store is unavailable.
+    web_concurrency: int = 1
+    supplier_rate_per_second: float = 5.0
+    supplier_rate_burst: int = 10
+    supplier_max_concurrency: int = 8
+    supplier_queue_deadline_interactive: float = 10.0
+    supplier_queue_deadline_bulk: float = 60.0
+    supplier_queue_deadline_background: float = 20.0
+
+    # Supplier result cache. The shared tier is a SQLite file under data_dir
+    # read by every worker on the host; when disabled each process keeps
+    # its own in-memory cache of supplier_cache_max_entries. The fetch lease
+    # is a floor: it is always stretched past the caller's queue deadline plus
+    # the supplier client timeout.
+    supplier_cache_ttl_seconds: int = 300
+    supplier_cache_max_entries: int = 5000
+    supplier_cache_lease_seconds: float = 30.0
+    shared_cache_enabled: bool = True
+    shared_cache_max_bytes: int = 64 * 1024 * 1024
+
+    # Search popularity counters: flush interval and how far back a hit counts.
+    search_stats_flush_seconds: float = 5.0
+    search_stats_window_days: int = 7
+
+    # Background refresh of the most searched articles.
+    prefetch_enabled: bool = True
+    prefetch_top_n: int = 200
+    prefetch_budget_per_minute: int = 60
+    prefetch_refresh_ahead_seconds: int = 60
+
+    # HTTP caching headers for /api/parts/search and /api/parts/brands.
+    http_cache_max_age_seconds: int = 60
+    http_cache_stale_while_revalidate_seconds: int = 240
+
+    # Cart price/availability revalidation; interval 0 disables the job.
+    cart_revalidate_interval_seconds: int = 900
+    cart_revalidate_concurrency: int = 4
+
+    # Admission control: concurrent requests and bounded wait queue per route
+    # class. Saturated classes answer 503 with Retry-After.
+    admission_enabled: bool = True
+    admission_queue_timeout_seconds: float = 2.0
+    admission_retry_after_seconds: int = 2
+    admission_auth_limit: int = 16
+    admission_auth_queue: int = 32
+    admission_search_limit: int = 32
+    admission_search_queue: int = 32
+    admission_cart_limit: int = 32
+    admission_cart_queue: int = 64
+    admission_static_limit: int = 64
+    admission_static_queue: int = 128
+
+    # Host-local state (article index etc.) that should survive restarts.
+    data_dir: str = "data"
+    suggest_index_max_entries: int = 200_000
+
 
 settings = Settings()
@@ -0,0 +1,253 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+from app.settings import settings
+
+# Bump when a table layout changes; transient tables are rebuilt on mismatch.
+_SCHEMA_VERSION = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    until REAL NOT NULL,
+    owner TEXT NOT NULL,
+    priority INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slots (
+    name TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    until REAL NOT NULL,
+    PRIMARY KEY (name, owner)
+);
+"""
+
+# Trim the store this often (in puts per process) rather than on every write.
+_EVICT_EVERY = 64
+
+
+class SqliteCache:
+    # Host-local byte store shared by every worker process on the box.
+    # WAL mode lets readers proceed while one worker writes; reads never
+    # write (eviction goes by expiry, not by access time), so a hit costs
+    # one indexed SELECT. Blocking sqlite calls run in the default executor.
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self._path = path
+        self._max_bytes = max_bytes
+        self._local = threading.local()
+        self._puts = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate(conn)
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        if conn.execute("PRAGMA user_version").fetchone()[0] == _SCHEMA_VERSION:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS leases")
+                conn.execute("DROP TABLE IF EXISTS buckets")
+                conn.execute("DROP TABLE IF EXISTS slots")
+                for stmt in _SCHEMA.split(";"):
+                    if stmt.strip():
+                        conn.execute(stmt)
+                conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # A broken or locked store degrades to a cache miss, never to a failed search.
+    async def get(self, key: str) -> bytes | None:
+        try:
+            return await asyncio.to_thread(self._get, key)
+        except sqlite3.Error:
+            return None
+
+    async def put(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        self._puts += 1
+        evict = self._puts % _EVICT_EVERY == 0
+        try:
+            await asyncio.to_thread(self._put, key, value, ttl_seconds, evict)
+        except sqlite3.Error:
+            pass
+
+    async def ttl_left(self, key: str) -> float:
+        try:
+            return await asyncio.to_thread(self._ttl_left, key)
+        except sqlite3.Error:
+            return 0.0
+
+    async def acquire(self, key: str, lease_seconds: float, *, owner: str, priority: int = 0) -> bool:
+        try:
+            return await asyncio.to_thread(self._acquire, key, lease_seconds, owner, priority)
+        except sqlite3.Error:
+            return True
+
+    async def release(self, key: str, *, owner: str) -> None:
+        try:
+            await asyncio.to_thread(self._release, key, owner)
+        except sqlite3.Error:
+            pass
+
+    async def take_token(self, name: str, rate: float, burst: float) -> float:
+        # Host-wide token bucket. Returns 0 when a token was taken, otherwise
+        # the seconds until one is due. Errors propagate so the caller can
+        # fall back to a local bucket.
+        return await asyncio.to_thread(self._take_token, name, rate, burst)
+
+    async def take_slot(self, name: str, owner: str, limit: int, lease_seconds: float) -> bool:
+        # Host-wide counting semaphore: True when fewer than `limit` unexpired
+        # slots are held and one was taken for `owner`. Errors propagate so
+        # the caller can fall back to a local cap.
+        return await asyncio.to_thread(self._take_slot, name, owner, limit, lease_seconds)
+
+    async def release_slot(self, name: str, owner: str) -> None:
+        try:
+            await asyncio.to_thread(self._release_slot, name, owner)
+        except sqlite3.Error:
+            # The slot expires on its own.
+            pass
+
+    def _get(self, key: str) -> bytes | None:
+        row = self._conn().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _ttl_left(self, key: str) -> float:
+        row = self._conn().execute("SELECT expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        return max(0.0, row[0] - time.time()) if row else 0.0
+
+    def _put(self, key: str, value: bytes, ttl_seconds: float, evict: bool) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, expires_at, size, value) VALUES (?, ?, ?, ?)",
+            (key, time.time() + ttl_seconds, len(value), value),
+        )
+        if evict:
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM leases WHERE until <= ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self._max_bytes:
+                # Free down to 90% of the limit, soonest-to-expire first.
+                excess = total - int(self._max_bytes * 0.9)
+                conn.execute(
+                    """
+                    DELETE FROM entries WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, size, SUM(size) OVER (ORDER BY expires_at, key) AS freed
+                            FROM entries
+                        ) WHERE freed - size < ?
+                    )
+                    """,
+                    (excess,),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _acquire(self, key: str, lease_seconds: float, owner: str, priority: int) -> bool:
+        # Taken when free or expired, renewed by the same owner, and preempted
+        # by a caller of more urgent priority (lower number).
+        now = time.time()
+        cur = self._conn().execute(
+            """
+            INSERT INTO leases (key, until, owner, priority) VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                until = excluded.until, owner = excluded.owner, priority = excluded.priority
+            WHERE leases.until <= ? OR leases.owner = excluded.owner OR leases.priority > excluded.priority
+            """,
+            (key, now + lease_seconds, owner, priority, now),
+        )
+        return cur.rowcount == 1
+
+    def _release(self, key: str, owner: str) -> None:
+        self._conn().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def _take_token(self, name: str, rate: float, burst: float) -> float:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+            if tokens >= 1.0:
+                tokens -= 1.0
+                wait = 0.0
+            else:
+                wait = (1.0 - tokens) / rate if rate > 0 else 1.0
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (name, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def _take_slot(self, name: str, owner: str, limit: int, lease_seconds: float) -> bool:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            # Slots of a worker that died mid-call expire instead of leaking.
+            conn.execute("DELETE FROM slots WHERE name = ? AND until <= ?", (name, now))
+            held = conn.execute("SELECT COUNT(*) FROM slots WHERE name = ?", (name,)).fetchone()[0]
+            taken = held < limit
+            if taken:
+                conn.execute(
+                    "INSERT OR REPLACE INTO slots (name, owner, until) VALUES (?, ?, ?)",
+                    (name, owner, now + lease_seconds),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return taken
+
+    def _release_slot(self, name: str, owner: str) -> None:
+        self._conn().execute("DELETE FROM slots WHERE name = ? AND owner = ?", (name, owner))
+
+
+def process_owner() -> str:
+    # Lease owner id for long-lived per-process holders such as background jobs.
+    return f"pid:{os.getpid()}"
+
+
+host_store: SqliteCache | None = (
+    SqliteCache(os.path.join(settings.data_dir, "supplier_cache.sqlite3"), settings.shared_cache_max_bytes)
+    if settings.shared_cache_enabled
+    else None
+)
@@ -0,0 +1,193 @@
+import bisect
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+from typing import BinaryIO
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import CartItem
+from app.settings import settings
+
+# How often suggest() checks the shared log for other workers' additions.
+_RELOAD_SECONDS = 2.0
+
+
+def normalize_article(article: str) -> str:
+    return article.strip().upper()
+
+
+class PrefixIndex:
+    # Sorted array + bisect: prefix lookup is two binary searches and a slice.
+    # Every worker appends what it learns to one shared log file and tails
+    # that file every few seconds, so all workers converge on the same index.
+    # Past max_entries the oldest articles are evicted, so the index keeps
+    # learning; the log is kept oldest first so age survives a rewrite.
+    def __init__(self, path: str | None = None, max_entries: int = 200_000) -> None:
+        self._path = path
+        self._max_entries = max(1, max_entries)
+        self._items: list[str] = []
+        # Insertion-ordered: the first key is the oldest.
+        self._known: dict[str, None] = {}
+        # Kept open so a rewrite by another worker can't recycle its inode
+        # and pass for the same file.
+        self._log: BinaryIO | None = None
+        self._offset = 0
+        # Lines in the log since it was last rewritten, duplicates included.
+        self._lines = 0
+        self._checked_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, article: str) -> bool:
+        return self.add_many([article]) > 0
+
+    def add_many(self, articles) -> int:
+        added = self._merge(articles)
+        self._append_to_file(added)
+        return len(added)
+
+    def _merge(self, articles) -> list[str]:
+        added: list[str] = []
+        for article in articles:
+            key = normalize_article(str(article))
+            if not key or len(key) > 64 or key in self._known:
+                continue
+            self._known[key] = None
+            added.append(key)
+        evicted: list[str] = []
+        while len(self._known) > self._max_entries:
+            oldest = next(iter(self._known))
+            del self._known[oldest]
+            evicted.append(oldest)
+        if len(added) + len(evicted) > 32:
+            self._items = sorted(self._known)
+        else:
+            for key in evicted:
+                i = bisect.bisect_left(self._items, key)
+                if i < len(self._items) and self._items[i] == key:
+                    del self._items[i]
+            for key in added:
+                if key in self._known:
+                    bisect.insort(self._items, key)
+        return added
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[str]:
+        key = normalize_article(prefix)
+        if not key:
+            return []
+        if time.monotonic() - self._checked_at >= _RELOAD_SECONDS:
+            self.reload()
+        items = self._items
+        start = bisect.bisect_left(items, key)
+        # "\uffff" sorts after any character that can follow the prefix.
+        end = bisect.bisect_left(items, key + "\uffff", lo=start, hi=min(len(items), start + limit))
+        return items[start:end]
+
+    def reload(self) -> None:
+        # Pick up lines appended by other workers since the last read.
+        self._checked_at = time.monotonic()
+        if not self._path:
+            return
+        self._read_log()
+        if self._bloated():
+            try:
+                self._compact(force=False)
+            except OSError:
+                pass
+
+    def _bloated(self) -> bool:
+        # Duplicates and evicted articles pile up in the append-only log.
+        return self._lines > 2 * len(self._known) + 1024
+
+    def _read_log(self) -> None:
+        try:
+            st = os.stat(self._path)
+            if self._log is None or os.fstat(self._log.fileno()).st_ino != st.st_ino:
+                # Rewritten by another worker: read it again from the start.
+                self._open_log()
+            self._log.seek(self._offset)
+            chunk = self._log.read()
+        except OSError:
+            return
+        # Leave a partially written last line for the next read.
+        complete = chunk.rfind(b"\n") + 1
+        self._offset += complete
+        lines = chunk[:complete].decode("utf-8", errors="ignore").splitlines()
+        self._lines += len(lines)
+        self._merge(line for line in lines if line.strip())
+
+    def load(self) -> None:
+        # Rewrites the log only if it has grown well past the index, not on
+        # every worker start.
+        self.reload()
+
+    def compact(self) -> None:
+        self._compact(force=True)
+
+    def _open_log(self) -> None:
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self._path, "rb")
+        self._offset = 0
+        self._lines = 0
+
+    @contextmanager
+    def _locked(self):
+        # Appends and rewrites from all workers are serialized on a sidecar
+        # lock file; the log itself is replaced by a rewrite, so it can't hold
+        # the lock.
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        with open(f"{self._path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _compact(self, *, force: bool) -> None:
+        if not self._path:
+            return
+        with self._locked():
+            # Take in lines other workers appended, so the rewrite keeps them.
+            self._read_log()
+            if not force and not self._bloated():
+                # Another worker rewrote it while this one waited for the lock.
+                return
+            tmp = f"{self._path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(f"{key}\n" for key in self._known)
+            os.replace(tmp, self._path)
+            self._open_log()
+            self._offset = os.fstat(self._log.fileno()).st_size
+            self._lines = len(self._known)
+
+    def _append_to_file(self, keys: list[str]) -> None:
+        if not self._path or not keys:
+            return
+        try:
+            with self._locked(), open(self._path, "ab") as f:
+                # Catch up first, so the offset can then skip this worker's
+                # own lines instead of merging them back (which would revive
+                # keys evicted since).
+                self._read_log()
+                f.write("".join(f"{key}\n" for key in keys).encode("utf-8"))
+                f.flush()
+                if self._log is not None:
+                    self._offset = f.tell()
+                    self._lines += len(keys)
+        except OSError:
+            # Index is still correct in memory; the article will be re-learned later.
+            pass
+
+
+article_index = PrefixIndex(
+    os.path.join(settings.data_dir, "suggest_index.txt"),
+    settings.suggest_index_max_entries,
+)
+
+
+async def seed_article_index(db: AsyncSession) -> None:
+    article_index.load()
+    res = await db.execute(select(CartItem.number).distinct())
+    article_index.add_many(res.scalars().all())
@@ -3,25 +3,29 @@ import re
 
 import httpx
 
+from app.outbound import Priority, supplier_scheduler
 from app.schemas import PartOffer
 from app.settings import settings
 
+REQUEST_TIMEOUT_SECONDS = 15.0
+
 
 class SupplierClient:
     def __init__(self) -> None:
-        self._client = httpx.AsyncClient(timeout=15.0)
+        self._client = httpx.AsyncClient(timeout=REQUEST_TIMEOUT_SECONDS)
 
     async def aclose(self) -> None:
         await self._client.aclose()
 
-    async def brands(self, article: str) -> list[str]:
+    async def brands(self, article: str, *, priority: Priority = Priority.INTERACTIVE) -> list[str]:
         article = article.strip()
         if not settings.supplier_api_base_url:
             raise RuntimeError("SUPPLIER_API_BASE_URL is not configured")
         _require_abstd_credentials()
         url = f"{settings.supplier_api_base_url.rstrip('/')}/api-brands"
         params = {"auth": _abstd_auth(), "article": article, "format": "json"}
-        resp = await self._client.get(url, params=params)
+        async with supplier_scheduler.slot(priority):
+            resp = await self._client.get(url, params=params)
         resp.raise_for_status()
         data = resp.json()
         if isinstance(data, list):
@@ -35,6 +39,7 @@ class SupplierClient:
         brand: str | None = None,
         with_cross: bool = False,
         show_unavailable: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
     ) -> list[PartOffer]:
         article = article.strip()
         if not settings.supplier_api_base_url:
@@ -55,7 +60,8 @@ class SupplierClient:
         if brand:
             params["brand"] = brand
 
-        resp = await self._client.get(url, params=params)
+        async with supplier_scheduler.slot(priority):
+            resp = await self._client.get(url, params=params)
         resp.raise_for_status()
         payload = resp.json()
         status_val = str(payload.get("status", "")).strip()
@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import struct
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, TypeVar
+
+from app.outbound import Priority, supplier_scheduler
+from app.schemas import PartOffer
+from app.settings import settings
+from app.shared_cache import SqliteCache, host_store
+from app.suggest import normalize_article
+from app.supplier import REQUEST_TIMEOUT_SECONDS, SupplierClient
+
+T = TypeVar("T")
+
+# Waiters poll for the holder's result, backing off up to the max interval.
+_LEASE_POLL_SECONDS = 0.05
+_LEASE_POLL_MAX_SECONDS = 1.0
+_LEASE_MARGIN_SECONDS = 5.0
+
+
+class SupplierFetchPending(RuntimeError):
+    pass
+
+
+def search_key(
+    article: str,
+    *,
+    brand: str | None = None,
+    with_cross: bool = False,
+    show_unavailable: bool = False,
+) -> str:
+    brand_key = (brand or "").strip().upper()
+    return f"search:{normalize_article(article)}:{brand_key}:{int(bool(with_cross))}:{int(bool(show_unavailable))}"
+
+
+def brands_key(article: str) -> str:
+    return f"brands:{normalize_article(article)}"
+
+
+# Offer lists are stored as packed binary rather than JSON: a format
+# version byte and the count, then per offer price/qty/delivery followed by
+# four length-prefixed UTF-8 strings. delivery_days of None is stored as -1.
+# Entries outlive restarts, so bump _FORMAT_VERSION whenever the layout
+# changes; entries in any other version are treated as cache misses.
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<BI")
+_OFFER = struct.Struct("<dqq")
+_STR_LEN = struct.Struct("<H")
+_INT64_MAX = 2**63 - 1
+
+
+class CacheDecodeError(ValueError):
+    pass
+
+
+def _clamp(value: int) -> int:
+    return max(-_INT64_MAX, min(_INT64_MAX, value))
+
+
+def _pack_str(out: bytearray, value: str) -> None:
+    raw = value.encode("utf-8")[:0xFFFF]
+    out += _STR_LEN.pack(len(raw))
+    out += raw
+
+
+def _unpack_str(buf: bytes, pos: int) -> tuple[str, int]:
+    (n,) = _STR_LEN.unpack_from(buf, pos)
+    pos += _STR_LEN.size
+    return buf[pos : pos + n].decode("utf-8", errors="replace"), pos + n
+
+
+def _unpack_header(buf: bytes) -> int:
+    version, count = _HEADER.unpack_from(buf, 0)
+    if version != _FORMAT_VERSION:
+        raise CacheDecodeError(f"Unsupported cache entry version {version}")
+    return count
+
+
+def encode_offers(offers: list[PartOffer]) -> bytes:
+    out = bytearray(_HEADER.pack(_FORMAT_VERSION, len(offers)))
+    for o in offers:
+        dd = -1 if o.delivery_days is None else _clamp(o.delivery_days)
+        out += _OFFER.pack(o.price, _clamp(o.qty), dd)
+        for value in (o.supplier, o.number, o.name, o.currency):
+            _pack_str(out, value)
+    return bytes(out)
+
+
+def decode_offers(buf: bytes) -> list[PartOffer]:
+    try:
+        count = _unpack_header(buf)
+        pos = _HEADER.size
+        offers: list[PartOffer] = []
+        for _ in range(count):
+            price, qty, dd = _OFFER.unpack_from(buf, pos)
+            pos += _OFFER.size
+            supplier, pos = _unpack_str(buf, pos)
+            number, pos = _unpack_str(buf, pos)
+            name, pos = _unpack_str(buf, pos)
+            currency, pos = _unpack_str(buf, pos)
+            offers.append(
+                PartOffer(
+                    supplier=supplier,
+                    number=number,
+                    name=name,
+                    price=price,
+                    currency=currency,
+                    qty=qty,
+                    delivery_days=None if dd < 0 else dd,
+                )
+            )
+    except struct.error as e:
+        raise CacheDecodeError(str(e)) from e
+    return offers
+
+
+def encode_strings(values: list[str]) -> bytes:
+    out = bytearray(_HEADER.pack(_FORMAT_VERSION, len(values)))
+    for value in values:
+        _pack_str(out, value)
+    return bytes(out)
+
+
+def decode_strings(buf: bytes) -> list[str]:
+    try:
+        count = _unpack_header(buf)
+        pos = _HEADER.size
+        values: list[str] = []
+        for _ in range(count):
+            value, pos = _unpack_str(buf, pos)
+            values.append(value)
+    except struct.error as e:
+        raise CacheDecodeError(str(e)) from e
+    return values
+
+
+class MemoryCache:
+    # Per-process fallback with the same interface as SqliteCache, used when
+    # the shared tier is disabled.
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        # key -> (until, owner, priority)
+        self._leases: dict[str, tuple[float, str, int]] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def put(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        self._data[key] = (time.monotonic() + ttl_seconds, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._max_entries:
+            self._data.popitem(last=False)
+
+    async def ttl_left(self, key: str) -> float:
+        entry = self._data.get(key)
+        if entry is None:
+            return 0.0
+        return max(0.0, entry[0] - time.monotonic())
+
+    async def acquire(self, key: str, lease_seconds: float, *, owner: str, priority: int = 0) -> bool:
+        now = time.monotonic()
+        held = self._leases.get(key)
+        if held is not None and held[0] > now and held[1] != owner and held[2] <= priority:
+            return False
+        self._leases[key] = (now + lease_seconds, owner, priority)
+        return True
+
+    async def release(self, key: str, *, owner: str) -> None:
+        held = self._leases.get(key)
+        if held is not None and held[1] == owner:
+            del self._leases[key]
+
+
+supplier_cache: SqliteCache | MemoryCache = host_store or MemoryCache(settings.supplier_cache_max_entries)
+
+
+def _lease_seconds(priority: Priority) -> float:
+    # The holder may sit out its whole queue deadline in the outbound
+    # scheduler and then the full client timeout. A lease shorter than that
+    # expires mid-fetch and lets every waiter go upstream at once.
+    worst = supplier_scheduler.deadline(priority) + REQUEST_TIMEOUT_SECONDS + _LEASE_MARGIN_SECONDS
+    return max(settings.supplier_cache_lease_seconds, worst)
+
+
+async def _read_through(
+    key: str,
+    fetch: Callable[[], Awaitable[T]],
+    encode: Callable[[T], bytes],
+    decode: Callable[[bytes], T],
+    refresh: bool,
+    priority: Priority,
+) -> tuple[bytes, T] | None:
+    async def cached() -> tuple[bytes, T] | None:
+        raw = await supplier_cache.get(key)
+        if raw is None:
+            return None
+        try:
+            return raw, decode(raw)
+        except ValueError:
+            # Corrupt or older-format entry: treat as a miss.
+            return None
+
+    if not refresh:
+        hit = await cached()
+        if hit is not None:
+            return hit
+
+    # Only one worker on the host fetches a given key at a time; the others
+    # wait for its result to land in the cache instead of going upstream too.
+    # A lease held by less urgent work (e.g. a background prefetch still
+    # queued in the outbound scheduler) is taken over rather than waited on.
+    lease = _lease_seconds(priority)
+    owner = uuid.uuid4().hex
+    leased = await supplier_cache.acquire(key, lease, owner=owner, priority=int(priority))
+    if not leased:
+        if refresh:
+            # Someone else is already refreshing this key; don't duplicate it.
+            return await cached()
+        delay = _LEASE_POLL_SECONDS
+        deadline = time.monotonic() + lease
+        while not leased:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                # Never go upstream without the lease: that is the stampede
+                # the lease exists to prevent.
+                raise SupplierFetchPending("Supplier fetch is still in progress, retry later")
+            await asyncio.sleep(min(delay, left))
+            delay = min(delay * 2, _LEASE_POLL_MAX_SECONDS)
+            hit = await cached()
+            if hit is not None:
+                return hit
+            leased = await supplier_cache.acquire(key, lease, owner=owner, priority=int(priority))
+
+    try:
+        value = await fetch()
+        raw = encode(value)
+        await supplier_cache.put(key, raw, settings.supplier_cache_ttl_seconds)
+    finally:
+        await supplier_cache.release(key, owner=owner)
+    return raw, value
+
+
+def etag_for(raw: bytes) -> str:
+    # The packed encoding is deterministic, so its hash is a stable content hash.
+    return f'"{hashlib.blake2b(raw, digest_size=16).hexdigest()}"'
+
+
+async def cached_search_entry(
+    article: str,
+    *,
+    brand: str | None = None,
+    with_cross: bool = False,
+    show_unavailable: bool = False,
+    refresh: bool = False,
+    priority: Priority = Priority.INTERACTIVE,
+    client: SupplierClient | None = None,
+) -> tuple[bytes, list[PartOffer]] | None:
+    # Returns the packed entry with its offers. None only for refresh=True
+    # when another worker holds the fetch lease and nothing is cached yet.
+    async def fetch() -> list[PartOffer]:
+        c = client or SupplierClient()
+        try:
+            return await c.search(
+                article,
+                brand=brand,
+                with_cross=with_cross,
+                show_unavailable=show_unavailable,
+                priority=priority,
+            )
+        finally:
+            if client is None:
+                await c.aclose()
+
+    key = search_key(article, brand=brand, with_cross=with_cross, show_unavailable=show_unavailable)
+    return await _read_through(key, fetch, encode_offers, decode_offers, refresh, priority)
+
+
+async def cached_search(article: str, **kwargs) -> list[PartOffer]:
+    entry = await cached_search_entry(article, **kwargs)
+    return entry[1] if entry is not None else []
+
+
+async def cached_brands_entry(
+    article: str,
+    *,
+    priority: Priority = Priority.INTERACTIVE,
+    client: SupplierClient | None = None,
+) -> tuple[bytes, list[str]]:
+    async def fetch() -> list[str]:
+        c = client or SupplierClient()
+        try:
+            return await c.brands(article, priority=priority)
+        finally:
+            if client is None:
+                await c.aclose()
+
+    # Without refresh _read_through always returns an entry.
+    return await _read_through(brands_key(article), fetch, encode_strings, decode_strings, False, priority)